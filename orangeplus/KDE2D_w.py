@@ -28,12 +28,13 @@ from AnyQt.QtWidgets import QListWidget
 from Orange.widgets.utils.widgetpreview import WidgetPreview
 from Orange.data import Table, ContinuousVariable
 from Orange.widgets import widget, gui, settings
-from Orange.widgets.widget import Input
+from Orange.widgets.widget import Input, Output
 
-import scipy.stats as st
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 
+from orangeplus.core import kde_grid, interpolate_density, add_metas
+
 """ gaussian_kde Parameters
     class scipy.stats.gaussian_kde(dataset, bw_method=None)
     
@@ -66,12 +67,16 @@ class KDE2D_w(widget.OWWidget):
     class Inputs:
         data = Input("Data", Table)
 
+    class Outputs:
+        density_data = Output("Data", Table)
+
     attrs = settings.Setting([])
     bw_methode = settings.Setting(0)
 
     def __init__(self):
         self.data = None
         self.all_attrs = []
+        self.attr_vars = []
         gui.listBox(self.controlArea, self, 'attrs',
                     labels='all_attrs',
                     box='Dataset attribute(s)',
@@ -97,15 +102,17 @@ class KDE2D_w(widget.OWWidget):
     def set_data(self, data):
         self.data = data = None if data is None else Table(data)
         self.all_attrs = []
+        self.attr_vars = []
         if data is None:
             # discards the old graph
             self.figure.clear()
             self.optionsBox.setDisabled(True)
+            self.Outputs.density_data.send(None)
             return
+        self.attr_vars = [var for var in data.domain.variables
+                          if isinstance(var, ContinuousVariable)]
         self.all_attrs = [(var.name, gui.attributeIconDict[var])
-                          for var in data.domain.variables
-                          if (var is not data and
-                              isinstance(var, ContinuousVariable))]
+                          for var in self.attr_vars]
         self.attrs = [0]
         self.optionsBox.setDisabled(False)
         self.on_changed()
@@ -116,45 +123,35 @@ class KDE2D_w(widget.OWWidget):
         self.on_changed()
 
     def on_changed(self):
-        if not self.attrs or not self.all_attrs:
-            return
         if self.data is None:
             return
+        if not self.attrs or not self.all_attrs:
+            self.figure.clear()
+            self.canvas.draw()
+            self.Outputs.density_data.send(None)
+            return
         
         if len(self.attrs) != 2:
+            self.Outputs.density_data.send(None)
             return
         
         # discards the old graph
         self.figure.clear()
 
         # Get names of attrs
-        attr_name = []
-        for attr in self.attrs:
-            attr_name.append(self.all_attrs[attr][0])
+        attr_vars = [self.attr_vars[attr] for attr in self.attrs]
+        attr_name = [var.name for var in attr_vars]
 
         # Get data
-        x = np.ravel(self.data.X[:,[self.attrs[0]]])
-        y = np.ravel(self.data.X[:,[self.attrs[1]]])
-
-        # Calc boundaries
-        dX = (max(x) - min(x))/3
-        xmin = min(x) - dX
-        xmax = max(x) + dX
-
-        dY = (max(y) - min(y))/3
-        ymin = min(y) - dY
-        ymax = max(y) + dY
+        x = self.data.get_column_view(attr_vars[0])[0].astype(float)
+        y = self.data.get_column_view(attr_vars[1])[0].astype(float)
 
-        # Create meshgrid
-        X, Y = np.mgrid[xmin:xmax:100j, ymin:ymax:100j]
+        # Calc KDE on a meshgrid
+        X, Y, Z = kde_grid(x, y, BW_METHOD[self.bw_methode][1])
 
-        # calc KDE
-        positions = np.vstack([X.ravel(), Y.ravel()])
-        values = np.vstack([x, y])
-        kernel = st.gaussian_kde(values, bw_method=BW_METHOD[self.bw_methode][1])
-        
-        # Calc Z
-        Z = np.reshape(kernel(positions).T, X.shape)
+        # boundaries
+        xmin, xmax = X[0, 0], X[-1, 0]
+        ymin, ymax = Y[0, 0], Y[0, -1]
 
         # create current axes
         ax = self.figure.gca()
@@ -180,5 +177,14 @@ class KDE2D_w(widget.OWWidget):
         # refresh canvas
         self.canvas.draw()
 
+        self.send_density(X, Y, Z, x, y, attr_name)
+
+    def send_density(self, X, Y, Z, x, y, attr_name):
+        # Interpolate the instances' density from the grid that is already
+        # computed for the plot, instead of evaluating the kernel per instance.
+        density = interpolate_density(X, Y, Z, x, y)
+        density_var = ContinuousVariable("Density (%s, %s)" % tuple(attr_name))
+        self.Outputs.density_data.send(add_metas(self.data, [density_var], [density]))
+
 if __name__ == "__main__":
     WidgetPreview(KDE2D_w).run(Table("iris"))
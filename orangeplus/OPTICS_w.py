@@ -28,14 +28,16 @@ from Orange.widgets.widget import Msg
 from Orange.widgets.utils.signals import Input, Output
 from Orange.widgets.utils.widgetpreview import WidgetPreview
 from Orange.widgets.utils.slidergraph import SliderGraph
-from Orange.data import Table, Domain, DiscreteVariable
+from Orange.data import Table
+from Orange.misc import DistMatrix
 
 from pyqtgraph import mkPen
 from pyqtgraph.functions import intColor
 
-from sklearn.cluster import OPTICS
 from sklearn.neighbors import VALID_METRICS
 
+from orangeplus.core import fit_optics, cluster_table
+
 
 """ OPTICS Parameters
     class sklearn.cluster.OPTICS(
@@ -61,6 +63,10 @@ from sklearn.neighbors import VALID_METRICS
     ‘kulsinski’, ‘mahalanobis’, ‘minkowski’, ‘rogerstanimoto’, ‘russellrao’, ‘seuclidean’, ‘sokalmichener’, ‘sokalsneath’, ‘sqeuclidean’, ‘yule’]
 
     See the documentation for scipy.spatial.distance for details on these metrics.
+
+    When a distance matrix is given on the "Distances" input, the metric is set to
+    'precomputed' and the matrix is passed to OPTICS instead of the data.
+    The neighborhood algorithm is then 'brute'.
 """
 
 OPTICS_METRICS = [
@@ -86,6 +92,12 @@ OPTICS_ALGORITHM = [
     ("Brute","brute"),
 ]
 
+SAMPLING_METHODS = [
+    ("Stratified", "stratified"),
+    ("Density-biased", "density"),
+]
+
+
 class OPTICS_w(widget.OWWidget):
     name = "OPTICS"
     description = "dynamicaly clustering unlabeled data by density"
@@ -94,6 +106,7 @@ class OPTICS_w(widget.OWWidget):
 
     class Inputs:
         data = Input("Data", Table)
+        distances = Input("Distances", DistMatrix)
 
     class Outputs:
         annotated_data = Output("Data", Table)
@@ -101,11 +114,24 @@ class OPTICS_w(widget.OWWidget):
     class Error(widget.OWWidget.Error):
         not_enough_instances = Msg("Not enough unique data instances. "
                                    "At least two are required.")
+        distances_mismatch = Msg("Distance matrix size does not match "
+                                 "the number of data instances.")
+        distances_not_square = Msg("Distance matrix must be square.")
+        no_data_for_distances = Msg("Distances are not computed from rows of "
+                                    "a data table; connect the Data input.")
+        optics_failed = Msg("OPTICS failed: {}")
+
+    class Warning(widget.OWWidget.Warning):
+        no_sampling_with_distances = Msg("Sampling is not used with precomputed "
+                                         "distances; OPTICS runs on all rows.")
 
     minimum_samples = settings.Setting(5)
     metric_methode = settings.Setting(11)
     xi_value = settings.Setting(0.05)
     algorithm_base = settings.Setting(0)
+    scalable_mode = settings.Setting(False)
+    sample_size = settings.Setting(10000)
+    sampling_method = settings.Setting(0)
     auto_commit = settings.Setting(False)
     cut_point = xi_value
     want_main_area = True
@@ -115,6 +141,7 @@ class OPTICS_w(widget.OWWidget):
         super().__init__()
 
         self.data = None
+        self.distances = None
         self.dataset = None
         self.annotated_data = None
 
@@ -124,6 +151,8 @@ class OPTICS_w(widget.OWWidget):
         self.infob = gui.widgetLabel(infobox, "")
         self.infoc = gui.widgetLabel(infobox, "")
         self.infod = gui.widgetLabel(infobox, "")
+        self.infoe = gui.widgetLabel(infobox, "")
+        self.infof = gui.widgetLabel(infobox, "")
 
         self.optionsBox = gui.widgetBox(self.controlArea, "OPTICS Options")
         gui.spin(
@@ -136,7 +165,7 @@ class OPTICS_w(widget.OWWidget):
             label="Core point neighbors ",
             callback=self._min_samples_changed
         )
-        gui.comboBox(
+        self.metric_combo = gui.comboBox(
             self.optionsBox,
             self,
             "metric_methode",
@@ -155,7 +184,7 @@ class OPTICS_w(widget.OWWidget):
             label="Minimum steepness: ",
             callback=self._xi_changed
         )
-        gui.comboBox(
+        self.algorithm_combo = gui.comboBox(
             self.optionsBox,
             self,
             "algorithm_base",
@@ -164,6 +193,33 @@ class OPTICS_w(widget.OWWidget):
             items=[d[0] for d in OPTICS_ALGORITHM],
             callback=self._algorithm_changed
         )
+        samplingBox = gui.widgetBox(self.optionsBox, "Large data")
+        gui.checkBox(
+            samplingBox,
+            self,
+            "scalable_mode",
+            "Fit on a sample, assign the rest",
+            callback=self._sampling_changed
+        )
+        gui.spin(
+            samplingBox,
+            self,
+            "sample_size",
+            minv=100,
+            maxv=1000000,
+            step=1000,
+            label="Sample size: ",
+            callback=self._sampling_changed
+        )
+        gui.comboBox(
+            samplingBox,
+            self,
+            "sampling_method",
+            orientation=Qt.Horizontal,
+            label="Sampling: ",
+            items=[d[0] for d in SAMPLING_METHODS],
+            callback=self._sampling_changed
+        )
         self.optionsBox.setDisabled(True)
         
         gui.auto_apply(self.controlArea, self, "auto_commit")
@@ -187,43 +243,62 @@ class OPTICS_w(widget.OWWidget):
             return False
         return True
 
-    def normalizing(self,model):
-        clusters = [c if c >= 0 else np.nan for c in model.labels_]
-        k = len(set(clusters) - {np.nan})
-        clusters = np.array(clusters).reshape(len(self.data), 1)
-
-        clust_var = DiscreteVariable("Cluster", values=["C%d" % (x + 1) for x in range(k)])
-
-        domain = self.data.domain
-        attributes, classes = domain.attributes, domain.class_vars
-        meta_attrs = domain.metas
-        x, y, metas = self.data.X, self.data.Y, self.data.metas
-
-        meta_attrs += (clust_var, )
-        metas = np.hstack((metas, clusters))
-
-        domain = Domain(attributes, classes, meta_attrs)
-        new_table = Table(domain, x, y, metas, self.data.W)
+    def check_distances(self, distances):
+        if distances is None:
+            return True
+        if distances.ndim != 2 or distances.shape[0] != distances.shape[1]:
+            self.Error.distances_not_square()
+            return False
+        if self.data is not None and distances.shape[0] != len(self.data):
+            self.Error.distances_mismatch()
+            return False
+        return True
 
-        # self.Outputs.annotated_data.send(new_table)
-        return new_table
+    def normalizing(self, labels, sample=None):
+        return cluster_table(self.data, labels, sample)
 
     def commit(self):
         self.cluster()
         return
 
     def cluster(self):
+        self.Error.optics_failed.clear()
+        self.Warning.no_sampling_with_distances.clear()
+        self.infof.setText('')
         if not self.check_data_size(self.data):
             return
 
-        model = OPTICS(min_samples=self.minimum_samples, 
-                                   metric=OPTICS_METRICS[self.metric_methode][1],
-                                   xi=self.xi_value,
-                                   algorithm=OPTICS_ALGORITHM[self.algorithm_base][1],
-                                   )
-        model.fit(self.data.X)
+        try:
+            if self.distances is not None:
+                if self.scalable_mode:
+                    self.Warning.no_sampling_with_distances()
+                model, labels, sample = fit_optics(
+                    np.asarray(self.distances, dtype=float),
+                    self.minimum_samples, "precomputed", self.xi_value, "brute")
+            else:
+                sample_size = self.sample_size if self.scalable_mode else None
+                y = self.data.Y if self.data.domain.has_discrete_class else None
+                model, labels, sample = fit_optics(
+                    self.data.X,
+                    self.minimum_samples,
+                    OPTICS_METRICS[self.metric_methode][1],
+                    self.xi_value,
+                    OPTICS_ALGORITHM[self.algorithm_base][1],
+                    sample_size=sample_size,
+                    sampling_method=SAMPLING_METHODS[self.sampling_method][1],
+                    y=y)
+        except (ValueError, TypeError, MemoryError) as ex:
+            self.Error.optics_failed(str(ex))
+            self.plot.clear_plot()
+            self.infoc.setText('')
+            self.infod.setText('')
+            self.Outputs.annotated_data.send(None)
+            return
         self._plot_graph(model)
-        self.result_OPTICS = self.normalizing(model)
+        if sample is not None:
+            self.infof.setText("%d sampled, %d assigned instances"
+                               % (len(sample), len(self.data) - len(sample)))
+        self.result_OPTICS = self.normalizing(labels, sample)
         self.send_data()
 
     def _plot_graph(self,model):
@@ -249,8 +324,24 @@ class OPTICS_w(widget.OWWidget):
 
     @Inputs.data
     def set_data(self, dataset):
+        self.dataset = dataset
+
+    @Inputs.distances
+    def set_distances(self, distances):
+        self.distances = distances
+
+    def handleNewSignals(self):
         self.Error.clear()
-        if not self.check_data_size(dataset):
+        self.data = self.dataset
+        row_items = getattr(self.distances, "row_items", None)
+        if self.data is None and isinstance(row_items, Table):
+            self.data = row_items
+        if self.distances is not None and self.data is None:
+            self.Error.no_data_for_distances()
+
+        if not self.check_data_size(self.data) \
+                or not self.check_distances(self.distances):
+            self.data = None
             self.optionsBox.setDisabled(True)
             self.plot.clear_plot()
             self.infoa.setText(
@@ -258,19 +349,27 @@ class OPTICS_w(widget.OWWidget):
             self.infob.setText('')
             self.infoc.setText('')
             self.infod.setText('')
-            self.dataset = None
+            self.infoe.setText('')
+            self.infof.setText('')
+            self.Warning.clear()
             self.annotated_data = None
             self.Outputs.annotated_data.send(None)
             return
 
-        self.data = dataset
         self.optionsBox.setDisabled(False)
-            
+        precomputed = self.distances is not None
+        self.metric_combo.setDisabled(precomputed)
+        self.algorithm_combo.setDisabled(precomputed)
+        self.infoe.setText("Using precomputed distances" if precomputed else "")
+
         self.numberOfInputInstances = len(self.data)
         self.infoa.setText("%d instances in input data set" % self.numberOfInputInstances)
-        numOfclasses = len(self.data.domain.class_var.values)
-        self.infob.setText("%d values in the categorical outcome" % numOfclasses)
-        
+        if self.data.domain.has_discrete_class:
+            numOfclasses = len(self.data.domain.class_var.values)
+            self.infob.setText("%d values in the categorical outcome" % numOfclasses)
+        else:
+            self.infob.setText('')
+
         self.commit()
 
     def checkCommit(self):
@@ -294,6 +393,11 @@ class OPTICS_w(widget.OWWidget):
     def _xi_changed(self):
         self.commit()
 
+    def _sampling_changed(self):
+        if self.data is None:
+            return
+        self.commit()
+
     def _algorithm_changed(self):
         if self.data is None:
             return
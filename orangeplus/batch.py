@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+""" A console batch runner for the Orange Plus algorithms.
+
+    Applies SMOTE balancing, OPTICS labelling and the KDE-2D grid export to many
+    .tab/.csv files at once, without opening the widgets' GUI. The algorithms come
+    from core.py, as in the widgets. Files are processed in a process pool; every
+    finished job is appended to a log in the output folder, so an interrupted run
+    picks up where it stopped when it is started again. A job is redone if its
+    settings or its input file changed since it was logged.
+    Outputs are written as Orange .tab files named <input file name>.<operation>.tab,
+    in the same subfolders as the inputs have below their common folder.
+
+    Usage:
+        orangeplus-batch settings.json data/*.tab -o results -j 4 [--trace-memory]
+
+    Settings file (JSON), every key is optional:
+        {
+            "operations": ["smote", "optics", "kde"],
+            "smote": {"sampling_strategy": "auto", "random_state": 0, "k_neighbors": 5},
+            "optics": {"min_samples": 5, "metric": "minkowski", "xi": 0.05,
+                       "algorithm": "auto", "sample_size": null,
+                       "sampling_method": "stratified"},
+            "kde": {"attributes": ["x", "y"], "bw_method": "scott", "grid_size": 100}
+        }
+
+    __author__ = Panagiotis Papadopoulos
+    __date__ = Oct 2026
+    __version__ = 0.1.0
+    __type__ = Orange Addon
+    __email__ = 'Panagiotis Papadopoulos' <panatronic@outlook.com>
+    __status__ = Dev
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from Orange.data import Table, Domain, ContinuousVariable
+from imblearn.over_sampling import SMOTE
+
+from orangeplus.core import fit_optics, cluster_table, kde_grid
+
+OPERATIONS = ("smote", "optics", "kde")
+
+DEFAULT_SETTINGS = {
+    "operations": list(OPERATIONS),
+    "smote": {"sampling_strategy": "auto", "random_state": 0, "k_neighbors": 5},
+    "optics": {"min_samples": 5, "metric": "minkowski", "xi": 0.05, "algorithm": "auto",
+               "sample_size": None, "sampling_method": "stratified"},
+    "kde": {"attributes": None, "bw_method": "scott", "grid_size": 100},
+}
+
+LOG_NAME = "batch_log.jsonl"
+
+# set in the workers by init_worker; tells them to skip the jobs that were
+# already queued when the run was interrupted
+_stop = None
+
+
+def load_settings(path):
+    with open(path, "r") as f:
+        user = json.load(f)
+    settings = {key: (dict(value) if isinstance(value, dict) else value)
+                for key, value in DEFAULT_SETTINGS.items()}
+    if not isinstance(user, dict):
+        raise ValueError("Settings must be a JSON object")
+    for key, value in user.items():
+        if key not in settings:
+            raise ValueError("Unknown settings key '%s'" % key)
+        if isinstance(settings[key], dict):
+            if not isinstance(value, dict):
+                raise ValueError("Settings of '%s' must be a JSON object" % key)
+            unknown = set(value) - set(settings[key])
+            if unknown:
+                raise ValueError("Unknown '%s' setting(s): %s"
+                                 % (key, ", ".join(sorted(unknown))))
+            settings[key].update(value)
+        else:
+            settings[key] = value
+    if not isinstance(settings["operations"], list):
+        raise ValueError("'operations' must be a list")
+    unknown = set(settings["operations"]) - set(OPERATIONS)
+    if unknown:
+        raise ValueError("Unknown operation(s): %s" % ", ".join(sorted(unknown)))
+    return settings
+
+
+def smote(data, params):
+    if not data.domain.has_discrete_class:
+        raise ValueError("SMOTE needs a categorical class variable")
+
+    # as in the widget, k must stay below the size of the smallest class
+    counts = np.bincount(data.Y[~np.isnan(data.Y)].astype(int))
+    k_neighbors = min(params["k_neighbors"], counts[counts > 0].min() - 1)
+    sm = SMOTE(sampling_strategy=params["sampling_strategy"],
+               random_state=params["random_state"],
+               k_neighbors=k_neighbors)
+    X_res, y_res = sm.fit_resample(data.X, data.Y)
+
+    # SMOTE appends the synthetic rows after the original ones;
+    # they get missing values for the metas.
+    synthetic = np.array([[var.Unknown for var in data.domain.metas]], dtype=object)
+    metas = np.vstack((data.metas, np.repeat(synthetic, len(y_res) - len(data), axis=0)))
+    return Table(data.domain, X_res, y_res, metas)
+
+
+def optics(data, params):
+    y = data.Y if data.domain.has_discrete_class else None
+    _, labels, sample = fit_optics(data.X,
+                                   params["min_samples"],
+                                   params["metric"],
+                                   params["xi"],
+                                   params["algorithm"],
+                                   sample_size=params["sample_size"],
+                                   sampling_method=params["sampling_method"],
+                                   y=y)
+    return cluster_table(data, labels, sample)
+
+
+def kde(data, params):
+    names = params["attributes"]
+    if names is None:
+        names = [var.name for var in data.domain.attributes
+                 if isinstance(var, ContinuousVariable)][:2]
+    if len(names) != 2:
+        raise ValueError("KDE-2D needs two continuous attributes")
+    x = data.get_column_view(names[0])[0].astype(float)
+    y = data.get_column_view(names[1])[0].astype(float)
+
+    X, Y, Z = kde_grid(x, y, params["bw_method"], params["grid_size"])
+
+    domain = Domain([ContinuousVariable(names[0]), ContinuousVariable(names[1]),
+                     ContinuousVariable("Density")])
+    return Table(domain, np.column_stack((X.ravel(), Y.ravel(), Z.ravel())))
+
+
+ALGORITHMS = {"smote": smote, "optics": optics, "kde": kde}
+
+
+def output_path(path, operation, out_dir, root):
+    # mirror the input's folders below `root`, so that day1/x.tab and day2/x.tab
+    # do not share an output; keep the extension, so that x.tab and x.csv do not
+    return os.path.join(out_dir, "%s.%s.tab" % (os.path.relpath(path, root), operation))
+
+
+def fingerprint(path, params):
+    """ Identify the settings and the input version that a result was made from. """
+    stat = os.stat(path)
+    params_json = json.dumps(params, sort_keys=True).encode("utf-8")
+    return {"params_hash": hashlib.sha1(params_json).hexdigest(),
+            "input_mtime": stat.st_mtime,
+            "input_size": stat.st_size}
+
+
+def init_worker(stop):
+    """ Pool initializer: Ctrl-C is handled by the main process only,
+        so that the jobs running at the time of an interrupt can finish. """
+    global _stop  # pylint: disable=global-statement
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _stop = stop
+
+
+def run_job(path, operation, params, out, trace_memory=False):
+    """ Run one operation on one file and save the result; return a log record,
+        or None if the run was interrupted before the job started. """
+    if _stop is not None and _stop.is_set():
+        return None
+    record = {"file": path, "operation": operation}
+    # write under a hidden name first, so a killed run leaves no partial output
+    tmp = os.path.join(os.path.dirname(out), "." + os.path.basename(out))
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = ALGORITHMS[operation](Table(path), params)
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        result.save(tmp)
+        os.replace(tmp, out)
+    except Exception as ex:  # pylint: disable=broad-except
+        record.update(status="error", error="%s: %s" % (type(ex).__name__, ex))
+    else:
+        record.update(status="ok", output=out, instances=len(result))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    if trace_memory:
+        record["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+    return record
+
+
+def collect(future, job, job_fingerprint):
+    """ Return the log record of a finished job, or None if it did not run. """
+    path, operation = job
+    try:
+        record = future.result()
+    except KeyboardInterrupt:
+        return None
+    except BrokenProcessPool as ex:
+        # a worker died (e.g. killed when out of memory); the job is retried next run
+        record = {"file": path, "operation": operation, "status": "error",
+                  "error": "worker process died: %s" % ex}
+    except Exception as ex:  # pylint: disable=broad-except
+        record = {"file": path, "operation": operation, "status": "error",
+                  "error": "%s: %s" % (type(ex).__name__, ex)}
+    if record is None:
+        return None
+    record.update(job_fingerprint)
+    return record
+
+
+def read_log(log_path):
+    """ Return the last log record of each (file, operation). """
+    records = {}
+    if not os.path.exists(log_path):
+        return records
+    with open(log_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:  # line cut off by an interrupted run
+                continue
+            records[(record["file"], record["operation"])] = record
+    return records
+
+
+def is_done(record, job_fingerprint):
+    return (record is not None
+            and record.get("status") == "ok"
+            and os.path.exists(record["output"])
+            and all(record.get(key) == value for key, value in job_fingerprint.items()))
+
+
+def format_record(record):
+    text = "%-8s %-40s" % (record["operation"], record["file"])
+    if "seconds" in record:
+        text += " %8.2f s" % record["seconds"]
+    if "peak_mb" in record:
+        text += " %8.1f MB" % record["peak_mb"]
+    if record["status"] != "ok":
+        text += "  FAILED: " + record["error"]
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="orangeplus-batch",
+        description="Apply SMOTE, OPTICS and KDE-2D to many data files.")
+    parser.add_argument("settings", help="JSON settings file")
+    parser.add_argument("files", nargs="+", help=".tab or .csv input files")
+    parser.add_argument("-o", "--output", default="orangeplus-output",
+                        help="output folder (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: all CPUs)")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore the log of a previous run and redo all files")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report each job's peak memory (tracemalloc); "
+                             "this slows the jobs down and inflates their times")
+    args = parser.parse_args(argv)
+
+    try:
+        settings = load_settings(args.settings)
+    except (OSError, ValueError) as ex:
+        parser.error("invalid settings file %s: %s" % (args.settings, ex))
+    files = list(dict.fromkeys(os.path.abspath(path) for path in args.files))
+    missing = [path for path in files if not os.path.isfile(path)]
+    if missing:
+        parser.error("input file(s) not found: %s" % ", ".join(missing))
+    root = os.path.commonpath([os.path.dirname(path) for path in files])
+
+    out_dir = os.path.abspath(args.output)
+    os.makedirs(out_dir, exist_ok=True)
+    log_path = os.path.join(out_dir, LOG_NAME)
+    if args.restart and os.path.exists(log_path):
+        os.remove(log_path)
+
+    logged = read_log(log_path)
+    # a logged result is reused only if it was written to the same output
+    jobs = {(path, op): dict(fingerprint(path, settings[op]),
+                             output=output_path(path, op, out_dir, root))
+            for path in files for op in settings["operations"]}
+    pending = [job for job, job_fingerprint in jobs.items()
+               if not is_done(logged.get(job), job_fingerprint)]
+    print("%d jobs, %d already done, %d to run"
+          % (len(jobs), len(jobs) - len(pending), len(pending)))
+
+    failed = 0
+    with open(log_path, "a") as log:
+        stop = multiprocessing.Event()
+        pool = ProcessPoolExecutor(max_workers=args.jobs,
+                                   initializer=init_worker, initargs=(stop, ))
+        futures = {pool.submit(run_job, path, op, settings[op],
+                               jobs[(path, op)]["output"],
+                               args.trace_memory): (path, op)
+                   for path, op in pending}
+        finished = set()
+        try:
+            for future in as_completed(futures):
+                finished.add(future)
+                record = collect(future, futures[future], jobs[futures[future]])
+                if record is None:
+                    continue
+                log.write(json.dumps(record) + "\n")
+                log.flush()
+                failed += record["status"] != "ok"
+                print(format_record(record))
+        except KeyboardInterrupt:
+            print("Interrupted; waiting for the running jobs to finish.")
+            # Cancel the queued jobs (as shutdown(cancel_futures=True) on Python 3.9+).
+            # The few that the pool has already handed to the workers cannot be
+            # cancelled; the stop event makes them return without running.
+            stop.set()
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=True)
+            for future in futures:
+                if future in finished or future.cancelled() or not future.done():
+                    continue
+                record = collect(future, futures[future], jobs[futures[future]])
+                if record is not None:
+                    log.write(json.dumps(record) + "\n")
+                    print(format_record(record))
+            log.flush()
+            return 130
+        pool.shutdown(wait=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+""" GUI-free algorithm cores of the Orange Plus widgets.
+
+    The OPTICS and KDE-2D widgets and the console batch runner (batch.py) share
+    these functions, so that both give the same results. Nothing here imports Qt.
+
+    __author__ = Panagiotis Papadopoulos
+    __date__ = Oct 2026
+    __version__ = 0.1.0
+    __type__ = Orange Addon
+    __email__ = 'Panagiotis Papadopoulos' <panatronic@outlook.com>
+    __status__ = Dev
+"""
+
+import numpy as np
+import scipy.stats as st
+from scipy.interpolate import RegularGridInterpolator
+
+from Orange.data import Table, Domain, DiscreteVariable
+
+from sklearn.cluster import OPTICS
+from sklearn.neighbors import NearestNeighbors
+
+
+# Rows per nearest-neighbor query when labelling the rows outside the sample
+ASSIGN_CHUNK_SIZE = 10000
+
+
+def sample_indices(X, y, size, method, metric, algorithm, random_state=0):
+    """ Return sorted indices of a sample of `size` rows of `X`.
+
+        'stratified' keeps the class proportions of `y` (uniform if `y` is None),
+        'density' favours rows in sparse regions, using the distance to the
+        k-th neighbor in a uniform pilot sample as the sparsity estimate.
+    """
+    n = len(X)
+    if size >= n:
+        return np.arange(n)
+    rng = np.random.RandomState(random_state)
+
+    if method == "density":
+        pilot = np.sort(rng.choice(n, size, replace=False))
+        nn = NearestNeighbors(n_neighbors=min(5, size), metric=metric,
+                              algorithm=algorithm).fit(X[pilot])
+        kdist = np.empty(n)
+        for start in range(0, n, ASSIGN_CHUNK_SIZE):
+            stop = start + ASSIGN_CHUNK_SIZE
+            dist, _ = nn.kneighbors(X[start:stop])
+            kdist[start:stop] = dist[:, -1]
+        weights = kdist + np.finfo(float).eps
+        return np.sort(rng.choice(n, size, replace=False, p=weights / weights.sum()))
+
+    if y is None:
+        return np.sort(rng.choice(n, size, replace=False))
+
+    y = np.asarray(y, dtype=float)
+    strata, members = np.unique(np.where(np.isnan(y), -1, y).astype(int),
+                                return_inverse=True)
+    counts = np.bincount(members)
+
+    # Largest-remainder allocation, so the strata add up exactly to `size`
+    quotas = counts * size / n
+    takes = np.floor(quotas).astype(int)
+    remainders = np.argsort(takes - quotas, kind="stable")
+    takes[remainders[:size - takes.sum()]] += 1
+
+    chosen = [rng.choice(np.flatnonzero(members == i), take, replace=False)
+              for i, take in enumerate(takes) if take]
+    return np.sort(np.concatenate(chosen))
+
+
+def assign_labels(X, sample, model, metric, algorithm):
+    """ Label all rows of `X` from an OPTICS `model` fitted on `X[sample]`.
+
+        Sampled rows keep their labels. Every other row takes the label of its
+        nearest core point if its reachability from that point does not exceed
+        the largest reachability inside the point's cluster; otherwise it is
+        noise (-1). Rows are processed in chunks of ASSIGN_CHUNK_SIZE.
+    """
+    labels = np.full(len(X), -1, dtype=int)
+    labels[sample] = model.labels_
+
+    core = np.flatnonzero(np.isfinite(model.core_distances_) & (model.labels_ >= 0))
+    if not len(core):
+        return labels
+
+    # Reachability threshold per cluster: the largest reachability of its
+    # members in the ordering, leaving out the jump into the cluster.
+    n_clusters = model.labels_.max() + 1
+    ordered_labels = model.labels_[model.ordering_]
+    ordered_reach = model.reachability_[model.ordering_]
+    thresholds = np.zeros(n_clusters)
+    for k in range(n_clusters):
+        reach = ordered_reach[ordered_labels == k][1:]
+        reach = reach[np.isfinite(reach)]
+        if len(reach):
+            thresholds[k] = reach.max()
+        else:
+            thresholds[k] = model.core_distances_[model.labels_ == k].max()
+
+    nn = NearestNeighbors(n_neighbors=1, metric=metric,
+                          algorithm=algorithm).fit(X[sample[core]])
+    rest = np.ones(len(X), dtype=bool)
+    rest[sample] = False
+    rest = np.flatnonzero(rest)
+    for start in range(0, len(rest), ASSIGN_CHUNK_SIZE):
+        rows = rest[start:start + ASSIGN_CHUNK_SIZE]
+        dist, ind = nn.kneighbors(X[rows])
+        nearest = core[ind[:, 0]]
+        reach = np.maximum(dist[:, 0], model.core_distances_[nearest])
+        cluster = model.labels_[nearest]
+        labels[rows] = np.where(reach <= thresholds[cluster], cluster, -1)
+    return labels
+
+
+def fit_optics(X, min_samples, metric, xi, algorithm,
+               sample_size=None, sampling_method="stratified", y=None):
+    """ Fit OPTICS on `X` and return (model, labels, sample).
+
+        If `sample_size` is smaller than the number of rows, the model is fitted on
+        a sample (see sample_indices) and the other rows are labelled by
+        assign_labels; otherwise `sample` is None and all rows are fitted.
+    """
+    model = OPTICS(min_samples=min_samples,
+                   metric=metric,
+                   xi=xi,
+                   algorithm=algorithm,
+                   )
+    if sample_size is None or sample_size >= len(X):
+        model.fit(X)
+        return model, model.labels_, None
+
+    sample = sample_indices(X, y, sample_size, sampling_method, metric, algorithm)
+    model.fit(X[sample])
+    labels = assign_labels(X, sample, model, metric, algorithm)
+    return model, labels, sample
+
+
+def add_metas(data, variables, columns):
+    """ Return `data` with `variables` appended as metas holding `columns`. """
+    domain = data.domain
+    domain = Domain(domain.attributes, domain.class_vars, domain.metas + tuple(variables))
+    metas = np.hstack((data.metas, np.column_stack(columns)))
+    return Table(domain, data.X, data.Y, metas, data.W)
+
+
+def cluster_table(data, labels, sample=None):
+    """ Return `data` with the OPTICS labels as a 'Cluster' meta (noise is missing).
+
+        With a `sample`, a 'Sample role' meta tells the fitted rows from the
+        assigned ones.
+    """
+    k = len(np.unique(labels[labels >= 0]))
+    clust_var = DiscreteVariable("Cluster", values=["C%d" % (x + 1) for x in range(k)])
+    variables = [clust_var]
+    columns = [np.where(labels >= 0, labels, np.nan)]
+
+    if sample is not None:
+        # 0 = fitted by OPTICS, 1 = labelled from the nearest core point
+        role = np.ones(len(data))
+        role[sample] = 0
+        variables.append(DiscreteVariable("Sample role", values=["Sampled", "Assigned"]))
+        columns.append(role)
+
+    return add_metas(data, variables, columns)
+
+
+def kde_grid(x, y, bw_method, grid_size=100):
+    """ Evaluate a Gaussian KDE of (x, y) on a grid_size x grid_size mesh.
+
+        The mesh extends a third of the data range past each side. Returns the
+        mesh coordinates X, Y and the densities Z, all of shape (grid_size, grid_size).
+    """
+    dX = (x.max() - x.min()) / 3
+    dY = (y.max() - y.min()) / 3
+    size = complex(0, grid_size)
+    X, Y = np.mgrid[x.min() - dX:x.max() + dX:size, y.min() - dY:y.max() + dY:size]
+
+    positions = np.vstack([X.ravel(), Y.ravel()])
+    kernel = st.gaussian_kde(np.vstack([x, y]), bw_method=bw_method)
+    Z = np.reshape(kernel(positions).T, X.shape)
+    return X, Y, Z
+
+
+def interpolate_density(X, Y, Z, x, y):
+    """ Density at the points (x, y), interpolated from the grid of kde_grid.
+
+        This costs O(1) per point, instead of evaluating the kernel at O(n) each.
+    """
+    interpolator = RegularGridInterpolator((X[:, 0], Y[0, :]), Z,
+                                           bounds_error=False, fill_value=0)
+    return interpolator(np.column_stack((x, y)))
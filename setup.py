@@ -38,7 +38,11 @@ setup(
         "Intended Audience :: Developers",
     ],
     # Declare orangeplus package to contain widgets for the "Orange Plus" category
-    entry_points = {"orange.widgets": "Orange Plus = orangeplus"},
+    # and a console script to run the same algorithms over many files
+    entry_points = {
+        "orange.widgets": "Orange Plus = orangeplus",
+        "console_scripts": ["orangeplus-batch = orangeplus.batch:main"],
+    },
     long_description = long_description,
     long_description_context_type = "text/markdown",
 )
\ No newline at end of file